@@ -1,11 +1,12 @@
 import os
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import time
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +19,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger("DerivAnalyzer")
 
+# Shared HTTP session so Deriv and Telegram calls reuse keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount("https://api.telegram.org/", _adapter)
+SESSION.mount("https://api.deriv.com/", _adapter)
+
+# The adapter does not retry POSTs, so sendMessage handles Telegram's 429s itself
+TELEGRAM_MAX_ATTEMPTS = 3
+
+# Market display names treated as derived indices
+_ALLOWED_MARKET_NAMES = frozenset({"Volatility Indices", "Step Index", "Range Break"})
+
 class DerivMarketAnalyzer:
     def __init__(self, deriv_app_id: Optional[str] = None):
         """
@@ -38,7 +55,7 @@ class DerivMarketAnalyzer:
             List of market dictionaries
         """
         try:
-            response = requests.get(
+            response = SESSION.get(
                 f"{self.api_url}/active_symbols",
                 params={
                     "active_symbols": "brief",
@@ -53,7 +70,7 @@ class DerivMarketAnalyzer:
             # Filter for derived indices
             derived_markets = [
                 market for market in data.get("active_symbols", [])
-                if market.get("market_display_name") in ["Volatility Indices", "Step Index", "Range Break"]
+                if market.get("market_display_name") in _ALLOWED_MARKET_NAMES
             ]
             
             logger.info(f"Fetched {len(derived_markets)} derived markets")
@@ -63,7 +80,7 @@ class DerivMarketAnalyzer:
             logger.error(f"Error fetching markets: {e}")
             return []
     
-    def fetch_market_quotes(self, symbol: str, count: int = 100) -> Optional[pd.DataFrame]:
+    def fetch_market_quotes(self, symbol: str, count: int = 100) -> Optional[Tuple[np.ndarray, np.ndarray]]:
         """
         Fetch historical quotes for a specific market symbol
         
@@ -72,10 +89,10 @@ class DerivMarketAnalyzer:
             count: Number of data points to retrieve
             
         Returns:
-            DataFrame with market data or None if failed
+            Tuple of (prices, epochs) arrays or None if failed
         """
         try:
-            response = requests.get(
+            response = SESSION.get(
                 f"{self.api_url}/ticks",
                 params={
                     "ticks_history": symbol,
@@ -91,11 +108,10 @@ class DerivMarketAnalyzer:
                 return None
                 
             ticks = data["history"]["ticks"]
-            df = pd.DataFrame(ticks)
-            df['quote'] = df['quote'].astype(float)
-            df['epoch'] = pd.to_datetime(df['epoch'], unit='s')
+            prices = np.fromiter((t['quote'] for t in ticks), dtype=np.float64, count=len(ticks))
+            epochs = np.fromiter((t['epoch'] for t in ticks), dtype=np.int64, count=len(ticks))
             
-            return df
+            return prices, epochs
             
         except Exception as e:
             logger.error(f"Error fetching quotes for {symbol}: {e}")
@@ -114,24 +130,20 @@ class DerivMarketAnalyzer:
         """
         try:
             # Fetch market data
-            df = self.fetch_market_quotes(symbol)
-            if df is None or len(df) < 50:
+            quotes = self.fetch_market_quotes(symbol)
+            if quotes is None or len(quotes[0]) < 50:
                 return None
+            prices, _ = quotes
             
-            # Calculate indicators
-            df['sma_20'] = df['quote'].rolling(window=20).mean()
-            df['sma_50'] = df['quote'].rolling(window=50).mean()
-            df['price_change'] = df['quote'].pct_change()
-            df['volatility'] = df['quote'].rolling(window=20).std()
-            
-            current_price = df['quote'].iloc[-1]
-            sma_20 = df['sma_20'].iloc[-1]
-            sma_50 = df['sma_50'].iloc[-1]
-            volatility = df['volatility'].iloc[-1]
+            # Calculate indicators over the latest window only
+            current_price = float(prices[-1])
+            sma_20 = float(prices[-20:].mean())
+            sma_50 = float(prices[-50:].mean())
+            volatility = float(prices[-20:].std(ddof=1))
             
             # Calculate recovery metrics
-            recent_low = df['quote'].tail(10).min()
-            recent_high = df['quote'].tail(10).max()
+            recent_low = prices[-10:].min()
+            recent_high = prices[-10:].max()
             recovery_from_low = ((current_price - recent_low) / recent_low) * 100
             recovery_from_high = ((current_price - recent_high) / recent_high) * 100
             
@@ -199,6 +211,24 @@ class DerivMarketAnalyzer:
         return signals
 
 
+# Telegram signal message; placeholders are the keys of an analysis result
+SIGNAL_MESSAGE_TEMPLATE = """
+🚀 <b>Deriv Trading Signal</b> 🚀
+
+<b>Market:</b> {market_name} ({symbol})
+<b>Signal:</b> <code>{signal}</code>
+<b>Type:</b> {trade_type}
+<b>Current Price:</b> {current_price:.4f}
+<b>Volatility:</b> {volatility:.4f}
+<b>Recovery from Low:</b> {recovery_from_low:.2f}%
+<b>Recovery from High:</b> {recovery_from_high:.2f}%
+
+<b>Timestamp:</b> {timestamp}
+
+⚠️ <i>Disclaimer: This is not financial advice. Trade at your own risk.</i>
+"""
+
+
 class TelegramBot:
     def __init__(self, bot_token: str, channel_id: str):
         """
@@ -226,16 +256,24 @@ class TelegramBot:
             # Format the message
             message = self.format_signal_message(analysis)
             
-            # Send to Telegram
-            response = requests.post(
-                self.api_url,
-                json={
-                    "chat_id": self.channel_id,
-                    "text": message,
-                    "parse_mode": "HTML"
-                },
-                timeout=10
-            )
+            # Send to Telegram, waiting out rate limits for as long as Telegram asks
+            for attempt in range(TELEGRAM_MAX_ATTEMPTS):
+                response = SESSION.post(
+                    self.api_url,
+                    json={
+                        "chat_id": self.channel_id,
+                        "text": message,
+                        "parse_mode": "HTML"
+                    },
+                    timeout=10
+                )
+                if response.status_code != 429 or attempt == TELEGRAM_MAX_ATTEMPTS - 1:
+                    break
+                
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                logger.warning(f"Telegram rate limit hit, retrying in {retry_after}s")
+                time.sleep(retry_after)
+            
             response.raise_for_status()
             
             logger.info(f"Signal sent to Telegram for {analysis['symbol']}")
@@ -255,33 +293,9 @@ class TelegramBot:
         Returns:
             Formatted HTML message string
         """
-        symbol = analysis["symbol"]
-        market = analysis["market_name"]
-        price = analysis["current_price"]
-        signal = analysis["signal"]
-        trade_type = analysis["trade_type"]
-        recovery_low = analysis["recovery_from_low"]
-        recovery_high = analysis["recovery_from_high"]
-        volatility = analysis["volatility"]
         timestamp = datetime.fromisoformat(analysis["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
         
-        message = f"""
-🚀 <b>Deriv Trading Signal</b> 🚀
-
-<b>Market:</b> {market} ({symbol})
-<b>Signal:</b> <code>{signal}</code>
-<b>Type:</b> {trade_type}
-<b>Current Price:</b> {price:.4f}
-<b>Volatility:</b> {volatility:.4f}
-<b>Recovery from Low:</b> {recovery_low:.2f}%
-<b>Recovery from High:</b> {recovery_high:.2f}%
-
-<b>Timestamp:</b> {timestamp}
-
-⚠️ <i>Disclaimer: This is not financial advice. Trade at your own risk.</i>
-        """
-        
-        return message
+        return SIGNAL_MESSAGE_TEMPLATE.format_map({**analysis, "timestamp": timestamp})
 
 
 def main():
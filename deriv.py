@@ -1,11 +1,19 @@
 import os
+from collections import deque
+import json
+import math
+import orjson
+import threading
 import requests
-import pandas as pd
+import websocket
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +26,345 @@ logging.basicConfig(
 )
 logger = logging.getLogger("DerivAnalyzer")
 
+# Shared HTTP session so Deriv and Telegram calls reuse keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount("https://api.telegram.org/", _adapter)
+SESSION.mount("https://api.deriv.com/", _adapter)
+
+# The adapter does not retry POSTs, so sendMessage handles Telegram's 429s itself
+TELEGRAM_MAX_ATTEMPTS = 3
+
+DERIV_WS_URL = "wss://ws.derivws.com/websockets/v3?app_id={app_id}"
+TICK_BUFFER_SIZE = 500
+WS_PING_INTERVAL = 30
+WS_PING_TIMEOUT = 10
+WS_RECONNECT_DELAY = 5
+# Streamed ticks older than this are treated as stale and the REST path is used instead
+STREAM_STALE_AFTER = 3 * WS_PING_INTERVAL
+INGEST_QUEUE_SIZE = 1024
+INGEST_BATCH_INTERVAL = 0.05
+ANALYSIS_WORKERS = 4
+REST_CALLS_PER_SECOND = 2
+
+
+class RateLimiter:
+    def __init__(self, calls_per_second: float):
+        """
+        Thread-safe limiter spacing calls at least 1/calls_per_second apart
+        """
+        self.interval = 1.0 / calls_per_second
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self) -> None:
+        """
+        Block until the next call slot is free
+        """
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TickBuffer:
+    def __init__(self, size: int = TICK_BUFFER_SIZE):
+        """
+        Fixed-size ring buffer holding the latest prices and epochs of one symbol
+        """
+        self.size = size
+        self.prices = np.empty(size, dtype=np.float64)
+        self.epochs = np.empty(size, dtype=np.int64)
+        self.index = 0
+        self.count = 0
+        # Guards the ring against the WebSocket thread writing mid-read
+        self.lock = threading.Lock()
+        # Running sums behind the SMA20/SMA50/stddev20 indicators
+        self.sum_20 = 0.0
+        self.sum_50 = 0.0
+        self.sumsq_20 = 0.0
+
+    def seed(self, prices: np.ndarray, epochs: np.ndarray) -> None:
+        """
+        Fill the buffer from a tick history reply, keeping the newest ticks
+        """
+        with self.lock:
+            n = min(len(prices), self.size)
+            self.prices[:n] = prices[len(prices) - n:]
+            self.epochs[:n] = epochs[len(epochs) - n:]
+            self.index = n % self.size
+            self.count = n
+            self.resync()
+
+    def extend(self, ticks: List[Tuple[float, int]]) -> None:
+        """
+        Append a batch of streamed ticks, overwriting the oldest ones once full
+        """
+        with self.lock:
+            for price, epoch in ticks:
+                # Slide each window: add the new price, drop the one leaving the window
+                if self.count >= 20:
+                    old = float(self.prices[(self.index - 20) % self.size])
+                    self.sum_20 += price - old
+                    self.sumsq_20 += price * price - old * old
+                else:
+                    self.sum_20 += price
+                    self.sumsq_20 += price * price
+                if self.count >= 50:
+                    self.sum_50 += price - float(self.prices[(self.index - 50) % self.size])
+                else:
+                    self.sum_50 += price
+                
+                self.prices[self.index] = price
+                self.epochs[self.index] = epoch
+                self.index = (self.index + 1) % self.size
+                self.count = min(self.count + 1, self.size)
+                
+                # Recompute exactly once per lap so float error cannot accumulate
+                if self.index == 0:
+                    self.resync()
+
+    def resync(self) -> None:
+        """
+        Recompute the running sums from the buffered prices; callers hold the lock
+        """
+        prices = self.latest(50)
+        last_20 = prices[-20:]
+        self.sum_20 = float(last_20.sum())
+        self.sum_50 = float(prices.sum())
+        self.sumsq_20 = float(np.dot(last_20, last_20))
+
+    def latest(self, n: int) -> np.ndarray:
+        """
+        Return a copy of the newest n prices, oldest first
+        """
+        n = min(n, self.count)
+        return self.prices[(self.index - n + np.arange(n)) % self.size]
+
+    def read(self, n: int) -> Tuple[int, int, np.ndarray, Tuple[float, float, float]]:
+        """
+        Return the tick count, newest epoch, newest n prices and indicators as one
+        consistent view
+        """
+        with self.lock:
+            newest_epoch = int(self.epochs[(self.index - 1) % self.size]) if self.count else 0
+            return self.count, newest_epoch, self.latest(n), self.indicators()
+
+    def indicators(self) -> Tuple[float, float, float]:
+        """
+        Return SMA20, SMA50 and the 20-tick sample stddev in O(1)
+        """
+        sma_20 = self.sum_20 / 20
+        sma_50 = self.sum_50 / 50
+        variance = (self.sumsq_20 - self.sum_20 * sma_20) / 19
+        return sma_20, sma_50, math.sqrt(max(0.0, variance))
+
+
+class DerivTickStream:
+    def __init__(self, app_id: str, buffer_size: int = TICK_BUFFER_SIZE):
+        """
+        Single Deriv WebSocket connection streaming ticks for all subscribed symbols
+        """
+        self.url = DERIV_WS_URL.format(app_id=app_id)
+        self.buffer_size = buffer_size
+        self.buffers: Dict[str, TickBuffer] = {}
+        self.symbols = set()
+        self.symbols_lock = threading.Lock()
+        self.connected = threading.Event()
+        self.has_connected = False
+        # Raw frames from the WebSocket thread; the oldest are dropped if ingest falls behind
+        self.ingest_queue = deque(maxlen=INGEST_QUEUE_SIZE)
+        self.dropped_frames = 0
+        # Held only for an append or a queue swap, so drops are counted exactly
+        self.ingest_lock = threading.Lock()
+        self.ws = None
+        self.thread = None
+        self.ingest_thread = None
+
+    def start(self) -> None:
+        """
+        Run the WebSocket connection on a background thread, keeping it alive with
+        pings and reconnecting (and resubscribing) whenever it drops or is closed, and
+        start the worker that applies received ticks
+        """
+        self.ingest_thread = threading.Thread(target=self.process_ingest_queue, daemon=True)
+        self.ingest_thread.start()
+        
+        self.thread = threading.Thread(target=self.run_stream, daemon=True)
+        self.thread.start()
+
+    def run_stream(self) -> None:
+        """
+        Run the WebSocket connection forever, restarting it whenever run_forever returns
+        """
+        while True:
+            # A fresh app per run: websocket-client 1.7 never resets its teardown state
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.on_open,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                on_close=self.on_close
+            )
+            # reconnect only covers socket errors and ping timeouts; when Deriv closes
+            # cleanly run_forever returns and this loop reconnects instead
+            self.ws.run_forever(
+                ping_interval=WS_PING_INTERVAL,
+                ping_timeout=WS_PING_TIMEOUT,
+                reconnect=WS_RECONNECT_DELAY,
+                # Text frames then arrive as undecoded bytes; orjson parses bytes and rejects
+                # invalid UTF-8 itself, so websocket-client's pure-Python check is redundant
+                skip_utf8_validation=True
+            )
+            self.connected.clear()
+            logger.warning(f"Tick stream stopped, reconnecting in {WS_RECONNECT_DELAY}s")
+            time.sleep(WS_RECONNECT_DELAY)
+
+    def subscribe(self, symbols: Iterable[str]) -> None:
+        """
+        Subscribe to tick history plus live ticks for any symbols not yet tracked
+        """
+        with self.symbols_lock:
+            new_symbols = [symbol for symbol in set(symbols) if symbol not in self.symbols]
+            self.symbols.update(new_symbols)
+        
+        if self.connected.is_set():
+            for symbol in new_symbols:
+                self.send_subscribe(symbol)
+
+    def send_subscribe(self, symbol: str) -> None:
+        """
+        Request the tick history of a symbol and stream its subsequent ticks; if the
+        socket is down the symbol stays tracked and on_open resubscribes it
+        """
+        try:
+            self.ws.send(json.dumps({
+                "ticks_history": symbol,
+                "end": "latest",
+                "count": self.buffer_size,
+                "style": "ticks",
+                "subscribe": 1
+            }))
+        except Exception as e:
+            # websocket-client reconnects without calling on_close, so notice the drop here
+            self.connected.clear()
+            logger.warning(f"Could not subscribe {symbol}, will retry on reconnect: {e}")
+
+    def get_buffer(self, symbol: str) -> Optional[TickBuffer]:
+        """
+        Return the tick buffer of a symbol or None if not streamed yet
+        """
+        return self.buffers.get(symbol)
+
+    def on_open(self, ws) -> None:
+        """
+        Subscribe every tracked symbol once the connection is up; after a reconnect the
+        history replies backfill each buffer so analysis resumes on warm data
+        """
+        # websocket-client calls on_open again after each automatic reconnect
+        if self.has_connected:
+            logger.info("Reconnected to Deriv tick stream, resubscribing")
+        else:
+            logger.info("Connected to Deriv tick stream")
+        self.has_connected = True
+        self.connected.set()
+        with self.symbols_lock:
+            symbols = list(self.symbols)
+        for symbol in symbols:
+            self.send_subscribe(symbol)
+
+    def on_message(self, ws, message: bytes) -> None:
+        """
+        Queue the raw (undecoded) frame for the ingest worker and return immediately
+        """
+        with self.ingest_lock:
+            if len(self.ingest_queue) == INGEST_QUEUE_SIZE:
+                self.dropped_frames += 1
+            self.ingest_queue.append(message)
+
+    def process_ingest_queue(self) -> None:
+        """
+        Drain queued frames every INGEST_BATCH_INTERVAL seconds and apply them in batches
+        """
+        while True:
+            with self.ingest_lock:
+                batch, self.ingest_queue = self.ingest_queue, deque(maxlen=INGEST_QUEUE_SIZE)
+                dropped, self.dropped_frames = self.dropped_frames, 0
+            
+            if dropped:
+                logger.warning(f"Tick ingest queue full; dropped {dropped} oldest frames")
+            
+            if batch:
+                try:
+                    self.apply_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error applying tick batch: {e}")
+            
+            time.sleep(INGEST_BATCH_INTERVAL)
+
+    def apply_batch(self, messages: Iterable[bytes]) -> None:
+        """
+        Seed buffers from history replies and append live ticks, one lock per symbol
+        """
+        pending: Dict[str, List[Tuple[float, int]]] = {}
+        
+        for message in messages:
+            try:
+                data = orjson.loads(message)
+
+                if "error" in data:
+                    logger.error(f"Tick stream error: {data['error'].get('message')}")
+                    continue
+
+                msg_type = data.get("msg_type")
+                if msg_type == "history":
+                    symbol = data["echo_req"]["ticks_history"]
+                    history = data["history"]
+                    buffer = TickBuffer(self.buffer_size)
+                    buffer.seed(
+                        np.asarray(history["prices"], dtype=np.float64),
+                        np.asarray(history["times"], dtype=np.int64)
+                    )
+                    # Ticks queued ahead of the history reply are already part of it
+                    pending.pop(symbol, None)
+                    self.buffers[symbol] = buffer
+                    logger.info(f"Loaded {buffer.count} historical ticks for {symbol}")
+
+                elif msg_type == "tick":
+                    tick = data["tick"]
+                    pending.setdefault(tick["symbol"], []).append((float(tick["quote"]), int(tick["epoch"])))
+
+            except Exception as e:
+                logger.error(f"Error processing tick stream message: {e}")
+        
+        for symbol, ticks in pending.items():
+            # If the history reply was dropped, rebuild the buffer from live ticks instead
+            buffer = self.buffers.get(symbol)
+            if buffer is None:
+                buffer = self.buffers[symbol] = TickBuffer(self.buffer_size)
+            buffer.extend(ticks)
+
+    def on_error(self, ws, error) -> None:
+        """
+        Log WebSocket errors and mark the stream as disconnected
+        """
+        logger.error(f"Tick stream error: {error}")
+        self.connected.clear()
+
+    def on_close(self, ws, close_status_code, close_msg) -> None:
+        """
+        Mark the stream as disconnected
+        """
+        logger.warning(f"Tick stream closed: {close_status_code} {close_msg}")
+        self.connected.clear()
+
+
 class DerivMarketAnalyzer:
     def __init__(self, deriv_app_id: Optional[str] = None):
         """
@@ -26,6 +373,8 @@ class DerivMarketAnalyzer:
         self.deriv_app_id = deriv_app_id or "1089"  # Default public API ID
         self.api_url = "https://api.deriv.com"
         self.markets_data = {}
+        self.stream = DerivTickStream(self.deriv_app_id)
+        self.rest_limiter = RateLimiter(REST_CALLS_PER_SECOND)
         
     def fetch_markets(self) -> List[Dict]:
         """
@@ -36,7 +385,8 @@ class DerivMarketAnalyzer:
         """
         try:
             # Use the correct API endpoint for active symbols
-            response = requests.get(
+            self.rest_limiter.wait()
+            response = SESSION.get(
                 f"{self.api_url}/active_symbols",
                 params={
                     "product_type": "basic",
@@ -61,13 +411,14 @@ class DerivMarketAnalyzer:
             logger.error(f"Error fetching markets: {e}")
             return []
     
-    def fetch_market_quotes(self, symbol: str, count: int = 100) -> Optional[pd.DataFrame]:
+    def fetch_market_quotes(self, symbol: str, count: int = 100) -> Optional[Tuple[np.ndarray, np.ndarray]]:
         """
-        Fetch historical quotes for a specific market symbol
+        Fetch historical quotes for a specific market symbol as (prices, epochs) arrays
         """
         try:
             # Use the correct API endpoint for ticks
-            response = requests.get(
+            self.rest_limiter.wait()
+            response = SESSION.get(
                 f"{self.api_url}/ticks_history",
                 params={
                     "ticks_history": symbol,
@@ -83,11 +434,10 @@ class DerivMarketAnalyzer:
                 return None
                 
             ticks = data["history"]["ticks"]
-            df = pd.DataFrame(ticks)
-            df['quote'] = df['quote'].astype(float)
-            df['epoch'] = pd.to_datetime(df['epoch'], unit='s')
+            prices = np.fromiter((t['quote'] for t in ticks), dtype=np.float64, count=len(ticks))
+            epochs = np.fromiter((t['epoch'] for t in ticks), dtype=np.int64, count=len(ticks))
             
-            return df
+            return prices, epochs
             
         except Exception as e:
             logger.error(f"Error fetching quotes for {symbol}: {e}")
@@ -98,25 +448,37 @@ class DerivMarketAnalyzer:
         Analyze a specific market for trading opportunities
         """
         try:
-            # Fetch market data
-            df = self.fetch_market_quotes(symbol)
-            if df is None or len(df) < 50:
-                return None
+            # Streamed symbols keep their indicators up to date on every tick
+            buffer = self.stream.get_buffer(symbol)
+            streamed = None
+            if buffer is not None:
+                streamed = buffer.read(10)
+                count, newest_epoch, _, _ = streamed
+                if time.time() - newest_epoch > STREAM_STALE_AFTER:
+                    logger.warning(f"Streamed ticks for {symbol} are stale, falling back to REST")
+                    streamed = None
+                elif count < 50:
+                    # A buffer rebuilt from live ticks (history reply dropped) is still warming up
+                    streamed = None
             
-            # Calculate indicators
-            df['sma_20'] = df['quote'].rolling(window=20).mean()
-            df['sma_50'] = df['quote'].rolling(window=50).mean()
-            df['price_change'] = df['quote'].pct_change()
-            df['volatility'] = df['quote'].rolling(window=20).std()
+            if streamed is not None:
+                _, _, recent_prices, (sma_20, sma_50, volatility) = streamed
+            else:
+                # Fall back to a REST fetch and compute over the latest window only
+                quotes = self.fetch_market_quotes(symbol)
+                if quotes is None or len(quotes[0]) < 50:
+                    return None
+                prices, _ = quotes
+                recent_prices = prices[-10:]
+                sma_20 = float(prices[-20:].mean())
+                sma_50 = float(prices[-50:].mean())
+                volatility = float(prices[-20:].std(ddof=1))
             
-            current_price = df['quote'].iloc[-1]
-            sma_20 = df['sma_20'].iloc[-1]
-            sma_50 = df['sma_50'].iloc[-1]
-            volatility = df['volatility'].iloc[-1]
+            current_price = float(recent_prices[-1])
             
             # Calculate recovery metrics
-            recent_low = df['quote'].tail(10).min()
-            recent_high = df['quote'].tail(10).max()
+            recent_low = recent_prices.min()
+            recent_high = recent_prices.max()
             recovery_from_low = ((current_price - recent_low) / recent_low) * 100
             recovery_from_high = ((current_price - recent_high) / recent_high) * 100
             
@@ -164,23 +526,48 @@ class DerivMarketAnalyzer:
         markets = self.fetch_markets()
         signals = []
         
-        for market in markets:
-            symbol = market.get("symbol")
-            market_name = market.get("market_display_name", "Unknown")
-            
-            logger.info(f"Analyzing {symbol} ({market_name})")
-            analysis = self.analyze_market(symbol, market_name)
-            
-            if analysis and analysis.get("signal"):
-                signals.append(analysis)
-                logger.info(f"Signal found for {symbol}: {analysis['signal']}")
+        # Newly seen symbols start streaming; until their history arrives they use REST
+        self.stream.subscribe(market.get("symbol") for market in markets)
+        
+        # Analyze concurrently; REST fallbacks share the rate limiter to stay respectful to the API
+        with ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS) as executor:
+            futures = []
+            for market in markets:
+                symbol = market.get("symbol")
+                market_name = market.get("market_display_name", "Unknown")
+                
+                logger.info(f"Analyzing {symbol} ({market_name})")
+                futures.append(executor.submit(self.analyze_market, symbol, market_name))
             
-            # Be respectful to the API
-            time.sleep(0.5)
+            # Collect in market order so signals are posted in the same order every cycle
+            for future in futures:
+                analysis = future.result()
+                
+                if analysis and analysis.get("signal"):
+                    signals.append(analysis)
+                    logger.info(f"Signal found for {analysis['symbol']}: {analysis['signal']}")
         
         return signals
 
 
+# Telegram signal message; placeholders are the keys of an analysis result
+SIGNAL_MESSAGE_TEMPLATE = """
+🚀 <b>Deriv Trading Signal</b> 🚀
+
+<b>Market:</b> {market_name} ({symbol})
+<b>Signal:</b> <code>{signal}</code>
+<b>Type:</b> {trade_type}
+<b>Current Price:</b> {current_price:.4f}
+<b>Volatility:</b> {volatility:.4f}
+<b>Recovery from Low:</b> {recovery_from_low:.2f}%
+<b>Recovery from High:</b> {recovery_from_high:.2f}%
+
+<b>Timestamp:</b> {timestamp}
+
+⚠️ <i>Disclaimer: This is not financial advice. Trade at your own risk.</i>
+"""
+
+
 class TelegramBot:
     def __init__(self, bot_token: str, channel_id: str):
         """
@@ -198,16 +585,24 @@ class TelegramBot:
             # Format the message
             message = self.format_signal_message(analysis)
             
-            # Send to Telegram
-            response = requests.post(
-                self.api_url,
-                json={
-                    "chat_id": self.channel_id,
-                    "text": message,
-                    "parse_mode": "HTML"
-                },
-                timeout=10
-            )
+            # Send to Telegram, waiting out rate limits for as long as Telegram asks
+            for attempt in range(TELEGRAM_MAX_ATTEMPTS):
+                response = SESSION.post(
+                    self.api_url,
+                    json={
+                        "chat_id": self.channel_id,
+                        "text": message,
+                        "parse_mode": "HTML"
+                    },
+                    timeout=10
+                )
+                if response.status_code != 429 or attempt == TELEGRAM_MAX_ATTEMPTS - 1:
+                    break
+                
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                logger.warning(f"Telegram rate limit hit, retrying in {retry_after}s")
+                time.sleep(retry_after)
+            
             response.raise_for_status()
             
             logger.info(f"Signal sent to Telegram for {analysis['symbol']}")
@@ -221,33 +616,9 @@ class TelegramBot:
         """
         Format analysis results into a readable Telegram message
         """
-        symbol = analysis["symbol"]
-        market = analysis["market_name"]
-        price = analysis["current_price"]
-        signal = analysis["signal"]
-        trade_type = analysis["trade_type"]
-        recovery_low = analysis["recovery_from_low"]
-        recovery_high = analysis["recovery_from_high"]
-        volatility = analysis["volatility"]
         timestamp = datetime.fromisoformat(analysis["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
         
-        message = f"""
-🚀 <b>Deriv Trading Signal</b> 🚀
-
-<b>Market:</b> {market} ({symbol})
-<b>Signal:</b> <code>{signal}</code>
-<b>Type:</b> {trade_type}
-<b>Current Price:</b> {price:.4f}
-<b>Volatility:</b> {volatility:.4f}
-<b>Recovery from Low:</b> {recovery_low:.2f}%
-<b>Recovery from High:</b> {recovery_high:.2f}%
-
-<b>Timestamp:</b> {timestamp}
-
-⚠️ <i>Disclaimer: This is not financial advice. Trade at your own risk.</i>
-        """
-        
-        return message
+        return SIGNAL_MESSAGE_TEMPLATE.format_map({**analysis, "timestamp": timestamp})
 
 
 def main():
@@ -264,6 +635,7 @@ def main():
     
     # Initialize components
     analyzer = DerivMarketAnalyzer()
+    analyzer.stream.start()
     telegram_bot = TelegramBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHANNEL_ID)
     
     logger.info("Starting Deriv market analysis...")